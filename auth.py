@@ -1,8 +1,8 @@
 from datetime import UTC, datetime, timedelta
+from functools import cache
 
 import jwt
 from fastapi.security import OAuth2PasswordBearer
-from pwdlib import PasswordHash
 
 
 from config import settings
@@ -17,16 +17,21 @@ import models
 from database import get_db
 
 
-password_hash=PasswordHash.recommended()
-
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="api/users/token")
 
+@cache
+def get_password_hash():
+  # argon2 is loaded on the first hash/verify instead of at startup
+  from pwdlib import PasswordHash
+  return PasswordHash.recommended()
+
+
 def hash_password(password:str) ->str:
-  return password_hash.hash(password)
+  return get_password_hash().hash(password)
 
 
 def verify_password(plain_password:str, hashed_password:str)-> bool:
-  return password_hash.verify(plain_password, hashed_password)
+  return get_password_hash().verify(plain_password, hashed_password)
 
 
 def create_access_token(data:dict, expires_delta:timedelta | None = None):
@@ -62,10 +67,11 @@ def verify_access_token(token:str)-> str|None:
     return payload.get("sub")
   
 
-async def get_current_user(
-    token:Annotated[str,Depends(oauth2_scheme)],
-    db:Annotated[AsyncSession, Depends(get_db)],
-)->models.User:
+def get_token_user_id(token:Annotated[str,Depends(oauth2_scheme)])->int:
+  """
+  User id from a valid token, without loading the user, so it also works for
+  accounts that have been soft-deleted since the token was issued.
+  """
   user_id = verify_access_token(token)
   if user_id is None:
 
@@ -83,10 +89,18 @@ async def get_current_user(
           detail="invalid or expired token",
           headers={"WWW-Authenticate":"Bearer"}
       )
-  
+
+  return user_id_int
+
+
+async def get_current_user(
+    token:Annotated[str,Depends(oauth2_scheme)],
+    db:Annotated[AsyncSession, Depends(get_db)],
+)->models.User:
+  user_id_int = get_token_user_id(token)
 
   result = await db.execute(
-      select(models.User).where(models.User.id == user_id_int)
+      select(models.User).where(models.User.id == user_id_int, models.User.deleted_at.is_(None))
   )
 
   user = result.scalars().first()
@@ -100,4 +114,16 @@ async def get_current_user(
   return user
 
 
-CurrentUser = Annotated[models.User, Depends(get_current_user)]
\ No newline at end of file
+CurrentUser = Annotated[models.User, Depends(get_current_user)]
+
+
+async def get_admin_user(current_user:CurrentUser)->models.User:
+  if current_user.id not in settings.admin_user_ids:
+    raise HTTPException(
+        status_code=status.HTTP_403_FORBIDDEN,
+        detail="admin access required"
+    )
+  return current_user
+
+
+AdminUser = Annotated[models.User, Depends(get_admin_user)]
\ No newline at end of file
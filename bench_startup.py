@@ -0,0 +1,116 @@
+"""
+Cold-start benchmark.
+
+Reports the import time of the app and its heaviest modules (python -X importtime),
+then boots uvicorn in a fresh process and measures time until /ready answers 200
+and until the first page is served.
+
+usage: python bench_startup.py [--top 15] [--path /posts] [--budget 2.0]
+"""
+import argparse
+import os
+import socket
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+
+APP_MODULES = ("main", "config", "database", "models", "schemas", "auth", "broadcaster", "purge", "profiling", "routers.users", "routers.posts", "routers.admin")
+
+
+def import_times(top:int)->tuple[int,list[tuple[int,str]]]:
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        capture_output=True, text=True, env=os.environ.copy(),
+    )
+    if result.returncode != 0:
+        sys.exit(result.stderr)
+
+    total = 0
+    modules = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        try:
+            cumulative_us = int(cumulative)
+        except ValueError:
+            continue  # header line
+        name = name.rstrip()
+        depth = (len(name) - len(name.lstrip())) // 2
+        name = name.strip()
+        if name == "main":
+            total = cumulative_us
+            continue
+        # direct imports of main, plus the project's own modules wherever they are imported
+        if depth == 1 or name in APP_MODULES:
+            modules.append((cumulative_us, name))
+
+    modules.sort(reverse=True)
+    return total, modules[:top]
+
+
+def free_port()->int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_for(url:str, deadline:float)->float:
+    while time.perf_counter() < deadline:
+        try:
+            with urllib.request.urlopen(url, timeout=1) as response:
+                if response.status == 200:
+                    return time.perf_counter()
+        except (urllib.error.URLError, ConnectionError):
+            pass
+        time.sleep(0.01)
+    raise TimeoutError(f"{url} not ready in time")
+
+
+def time_to_first_request(path:str, timeout:float)->tuple[float,float,float]:
+    port = free_port()
+    base = f"http://127.0.0.1:{port}"
+    start = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        ready_at = wait_for(f"{base}/ready", start + timeout)
+        request_start = time.perf_counter()
+        with urllib.request.urlopen(f"{base}{path}", timeout=timeout) as response:
+            response.read()
+        served_at = time.perf_counter()
+    finally:
+        server.terminate()
+        server.wait()
+
+    return ready_at - start, served_at - start, served_at - request_start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--top", type=int, default=15, help="number of modules to list")
+    parser.add_argument("--path", default="/posts", help="first request to serve after /ready")
+    parser.add_argument("--budget", type=float, default=None, help="fail if time to first request exceeds this many seconds")
+    parser.add_argument("--timeout", type=float, default=30.0)
+    args = parser.parse_args()
+
+    total, modules = import_times(args.top)
+    print(f"import main: {total / 1000:.1f} ms")
+    for cumulative_us, name in modules:
+        print(f"  {cumulative_us / 1000:8.1f} ms  {name}")
+
+    to_ready, to_first, first_request = time_to_first_request(args.path, args.timeout)
+    print(f"process start -> /ready: {to_ready * 1000:.1f} ms")
+    print(f"process start -> first {args.path}: {to_first * 1000:.1f} ms (request itself {first_request * 1000:.1f} ms)")
+
+    if args.budget is not None and to_first > args.budget:
+        sys.exit(f"cold start {to_first:.3f}s exceeds budget {args.budget:.3f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+import asyncio
+import json
+import signal
+import threading
+import time
+from collections import deque
+from collections.abc import AsyncIterator
+from itertools import count
+
+from config import settings
+
+
+class Subscription:
+  """
+  One connected stream client. Holds a bounded queue of pre-encoded SSE frames.
+  """
+  def __init__(self, maxsize:int):
+    self.queue:asyncio.Queue[str|None] = asyncio.Queue(maxsize=maxsize)
+
+
+class Broadcaster:
+  """
+  In-process fan-out of post events to SSE subscribers.
+
+  Each event is encoded once and pushed onto every subscriber queue without
+  awaiting, so a single write costs one put_nowait per idle connection and no DB access.
+  A short replay buffer lets reconnecting clients resume from Last-Event-ID.
+
+  Event ids are "<epoch>-<seq>", the epoch being this process's start time, so ids
+  from another process or older than the replay buffer are detected and answered
+  with a reset event telling the client to re-fetch GET /api/posts.
+  """
+  def __init__(self, queue_size:int, replay_size:int, slow_consumer_policy:str = "reset"):
+    if slow_consumer_policy not in ("reset", "disconnect"):
+      raise ValueError(f"unknown slow consumer policy: {slow_consumer_policy}")
+
+    self.queue_size = queue_size
+    self.slow_consumer_policy = slow_consumer_policy
+    self._subscribers:set[Subscription] = set()
+    self._replay:deque[tuple[int,str]] = deque(maxlen=replay_size)
+    self._ids = count(1)
+    self._last_seq = 0
+    self.epoch = str(time.time_ns() // 1_000_000)
+    self.closed = False
+
+  def publish(self, event:str, data:dict)->str:
+    seq = next(self._ids)
+    self._last_seq = seq
+    event_id = f"{self.epoch}-{seq}"
+    frame = f"id: {event_id}\nevent: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+    self._replay.append((seq, frame))
+
+    for sub in list(self._subscribers):
+      try:
+        sub.queue.put_nowait(frame)
+      except asyncio.QueueFull:
+        self._handle_slow_consumer(sub, frame)
+
+    return event_id
+
+  def _reset_frame(self)->str:
+    # carries the latest id, so a client that reconnects afterwards resumes from here
+    return f"id: {self.epoch}-{self._last_seq}\nevent: reset\ndata: {{}}\n\n"
+
+  def _handle_slow_consumer(self, sub:Subscription, frame:str):
+    if self.slow_consumer_policy == "reset":
+      # the client misses events either way, so the queued ones are replaced by a
+      # single reset telling it to re-fetch GET /api/posts, which includes this event
+      while not sub.queue.empty():
+        sub.queue.get_nowait()
+      sub.queue.put_nowait(self._reset_frame())
+      return
+
+    # disconnect: the client reconnects with Last-Event-ID and catches up from the replay buffer
+    self._end(sub)
+
+  def _end(self, sub:Subscription):
+    # empty the queue and leave only the close sentinel, the stream ends on its next read
+    self._subscribers.discard(sub)
+    while not sub.queue.empty():
+      sub.queue.get_nowait()
+    sub.queue.put_nowait(None)
+
+  def close(self):
+    """
+    End every open stream and refuse new ones, so the server is not left
+    waiting on idle connections at shutdown.
+    """
+    self.closed = True
+    for sub in list(self._subscribers):
+      self._end(sub)
+
+  def _replay_after(self, last_event_id:str)->list[str]:
+    epoch, _, seq = last_event_id.partition("-")
+    try:
+      last_seq = int(seq)
+    except ValueError:
+      last_seq = None
+
+    oldest_seq = self._replay[0][0] if self._replay else self._last_seq + 1
+    if epoch != self.epoch or last_seq is None or not oldest_seq - 1 <= last_seq <= self._last_seq:
+      # unknown process or out of the replay window: some events can't be replayed
+      return [self._reset_frame()]
+    return [frame for seq, frame in self._replay if seq > last_seq]
+
+  def subscribe(self, last_event_id:str|None = None)->tuple[Subscription,list[str]]:
+    # registration and replay snapshot happen without an await in between,
+    # so no event published meanwhile can be missed or duplicated
+    sub = Subscription(self.queue_size)
+    if self.closed:
+      sub.queue.put_nowait(None)
+      return sub, []
+    self._subscribers.add(sub)
+
+    if last_event_id is None:
+      return sub, []
+    return sub, self._replay_after(last_event_id)
+
+  def unsubscribe(self, sub:Subscription):
+    self._subscribers.discard(sub)
+
+  async def stream(self, last_event_id:str|None = None, heartbeat:float|None = None)->AsyncIterator[str]:
+    heartbeat = settings.sse_heartbeat_seconds if heartbeat is None else heartbeat
+    sub, backlog = self.subscribe(last_event_id)
+    try:
+      yield f"retry: {settings.sse_retry_ms}\n\n"
+      for frame in backlog:
+        yield frame
+
+      while True:
+        try:
+          frame = await asyncio.wait_for(sub.queue.get(), timeout=heartbeat)
+        except TimeoutError:
+          yield ": keepalive\n\n"
+          continue
+
+        if frame is None:
+          return
+        yield frame
+    finally:
+      self.unsubscribe(sub)
+
+
+def close_on_exit_signals(broadcaster:Broadcaster):
+  """
+  uvicorn waits for open connections to finish before it runs lifespan shutdown,
+  so streams are closed as soon as SIGINT/SIGTERM arrives. The server's own
+  handler is chained, and the returned callable restores it.
+  """
+  if threading.current_thread() is not threading.main_thread():
+    return lambda: None
+
+  loop = asyncio.get_running_loop()
+  previous = {sig: signal.getsignal(sig) for sig in (signal.SIGINT, signal.SIGTERM)}
+
+  def handle_exit(sig, frame):
+    loop.call_soon_threadsafe(broadcaster.close)
+    handler = previous[sig]
+    if callable(handler):
+      handler(sig, frame)
+    else:
+      signal.signal(sig, handler)
+      signal.raise_signal(sig)
+
+  for sig in previous:
+    signal.signal(sig, handle_exit)
+
+  def restore():
+    for sig, handler in previous.items():
+      if signal.getsignal(sig) is handle_exit:
+        signal.signal(sig, handler)
+
+  return restore
+
+
+post_events = Broadcaster(
+  queue_size=settings.sse_queue_size,
+  replay_size=settings.sse_replay_size,
+  slow_consumer_policy=settings.sse_slow_consumer_policy,
+)
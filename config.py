@@ -1,3 +1,5 @@
+from typing import Literal
+
 from pydantic import SecretStr
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
@@ -12,5 +14,23 @@ class Settings(BaseSettings):
   algorithm:str = "HS256"
   access_token_expire_minutes:int = 30
 
+  create_schema_on_startup:bool = True
+  ready_check_timeout_seconds:float = 2.0
+  purge_chunk_size:int = 500
+  purge_max_retries:int = 5
+  purge_retry_backoff_seconds:float = 0.5
+  purge_status_ttl_seconds:float = 3600.0
+
+  admin_user_ids:set[int] = set()
+  slow_request_ms:float = 500.0
+  slow_request_buffer:int = 100
+  profile_buffer:int = 20
+
+  sse_queue_size:int = 100
+  sse_replay_size:int = 500
+  sse_heartbeat_seconds:float = 15.0
+  sse_retry_ms:int = 3000
+  sse_slow_consumer_policy:Literal["reset","disconnect"] = "reset"
+
 
 settings = Settings()
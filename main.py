@@ -1,36 +1,62 @@
 
 from typing import Annotated
 from contextlib import asynccontextmanager
+from functools import cache
 from fastapi.exception_handlers import http_exception_handler,request_validation_exception_handler
+import asyncio
 import time
 
 from fastapi import FastAPI, Request, HTTPException, status, Depends
+from fastapi.responses import JSONResponse
 from fastapi.staticfiles import StaticFiles
-from fastapi.templating import Jinja2Templates
 from fastapi.exceptions import RequestValidationError
 from starlette.exceptions import HTTPException as StarletteHTTPException
 from starlette.middleware.base import BaseHTTPMiddleware
 
 
-from sqlalchemy import select
+from sqlalchemy import select, text
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from broadcaster import close_on_exit_signals, post_events
+from config import settings
 from database import Base, engine, get_db
 import models
-from routers import posts, users
+from migrations import upgrade_schema
+from profiling import ProfilingMiddleware, record_template
+from purge import cancel_purges, resume_pending_purges
+from routers import admin, posts, users
 
 @asynccontextmanager
-async def lifespan(_app:FastAPI):
+async def lifespan(app:FastAPI):
 
     async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
+        if settings.create_schema_on_startup:
+            await conn.run_sync(Base.metadata.create_all)
+        # always runs, existing databases must be upgraded even when schema creation is skipped
+        await conn.run_sync(upgrade_schema)
+    await resume_pending_purges()
+    restore_signals = close_on_exit_signals(post_events)
     yield
+    post_events.close()
+    restore_signals()
+    await cancel_purges()
     await engine.dispose()
 
 app = FastAPI(lifespan=lifespan)
 app.mount("/static",StaticFiles(directory="static"),name="static")
 app.mount("/media",StaticFiles(directory="media"), name="media")
-templates = Jinja2Templates(directory="templates")
+
+@cache
+def get_templates():
+    # jinja2 is imported and the environment built on the first rendered page
+    from fastapi.templating import Jinja2Templates
+    return Jinja2Templates(directory="templates")
+
+def render_template(request:Request, name:str, context:dict|None = None, **kwargs):
+    start_time = time.perf_counter()
+    response = get_templates().TemplateResponse(request, name, context, **kwargs)
+    record_template(name, time.perf_counter() - start_time)
+    return response
 
 #***************************************************middleware*********************************************************
 
@@ -56,7 +82,8 @@ class RequestTimingMiddleware(BaseHTTPMiddleware):
 
         return response
 
-# Register middleware
+# Register middleware (profiling innermost, so it sees only the app itself)
+app.add_middleware(ProfilingMiddleware)
 app.add_middleware(RequestTimingMiddleware)
 
 # Function-based logging middleware
@@ -80,10 +107,24 @@ async def log_requests(request: Request, call_next):
 
     return response
 
+#***************************************************readiness probe*********************************************************
+@app.get("/ready", include_in_schema=False)
+async def ready():
+    # uvicorn only accepts connections once lifespan startup has finished,
+    # so the probe checks that the database still answers
+    try:
+        async with asyncio.timeout(settings.ready_check_timeout_seconds):
+            async with engine.connect() as conn:
+                await conn.execute(text("SELECT 1"))
+    except Exception as error:
+        print(f"❌ Readiness check failed: {error!r}")
+        return JSONResponse({"status":"unavailable"}, status_code=status.HTTP_503_SERVICE_UNAVAILABLE)
+    return {"status":"ready"}
+
 #***************************************************html posts pages*********************************************************
 @app.get("/", include_in_schema=False)
 async def home(request:Request):
-    return templates.TemplateResponse(
+    return render_template(
     request,
     "default.html",{
     "greeting":"Welcome to the vaada blogs",
@@ -94,9 +135,12 @@ async def home(request:Request):
 
 @app.get("/posts", include_in_schema=False)
 async def get_posts_html(request:Request, db:Annotated[AsyncSession, Depends(get_db)] ):
-    result = await db.execute(select(models.Post).order_by(models.Post.date_posted.desc()))
+    result = await db.execute(
+    select(models.Post).join(models.Post.author).where(models.User.deleted_at.is_(None))
+    .order_by(models.Post.date_posted.desc())
+    )
     posts = result.scalars().all()
-    return templates.TemplateResponse(request,"posts.html", 
+    return render_template(request,"posts.html", 
         {
             "posts":posts,
             "title":"all posts"
@@ -104,12 +148,14 @@ async def get_posts_html(request:Request, db:Annotated[AsyncSession, Depends(get
 
 @app.get("/posts/{post_id}", include_in_schema=False)
 async def get_post_html(request:Request, post_id:int, db:Annotated[AsyncSession, Depends(get_db)]):
-    result = await db.execute(select(models.Post).where(models.Post.id == post_id))
+    result = await db.execute(
+    select(models.Post).join(models.Post.author).where(models.Post.id == post_id, models.User.deleted_at.is_(None))
+    )
     post = result.scalars().first()
 
     if post:
         title = post.title[:50]
-        return templates.TemplateResponse(request,"post.html",
+        return render_template(request,"post.html",
         {
             "post":post,
             "title":title
@@ -122,7 +168,7 @@ async def get_post_html(request:Request, post_id:int, db:Annotated[AsyncSession,
 @app.get("/users/{user_id}/posts", include_in_schema=False)
 async def get_user_posts_html(request:Request, user_id:int,db:Annotated[AsyncSession, Depends(get_db)]):
     result = await db.execute(
-    select(models.User).where(models.User.id == user_id),
+    select(models.User).where(models.User.id == user_id, models.User.deleted_at.is_(None)),
     )
     user = result.scalars().first()
 
@@ -131,7 +177,7 @@ async def get_user_posts_html(request:Request, user_id:int,db:Annotated[AsyncSes
     
     result = await db.execute(select(models.Post).order_by(models.Post.date_posted.desc()).where(models.Post.user_id == user_id))
     posts = result.scalars().all()
-    return templates.TemplateResponse(request,"user_posts.html",
+    return render_template(request,"user_posts.html",
     {
         "posts":posts,
         "title":"user posts"
@@ -141,12 +187,13 @@ async def get_user_posts_html(request:Request, user_id:int,db:Annotated[AsyncSes
 
 app.include_router(users.router, prefix="/api/users", tags=["users"])
 app.include_router(posts.router, prefix="/api/posts", tags=["posts"])
+app.include_router(admin.router, prefix="/api/admin", tags=["admin"])
 
 #***************************************************login/register*********************************************************
 
 @app.get("/register",include_in_schema=False)
 async def register_page(request:Request):
-    return templates.TemplateResponse(
+    return render_template(
         request,
         "register.html",
         {"title":"Register"}
@@ -154,7 +201,7 @@ async def register_page(request:Request):
 
 @app.get("/login",include_in_schema=False)
 async def login_page(request:Request):
-    return templates.TemplateResponse(
+    return render_template(
         request,
         "login.html",
         {"title":"login"}
@@ -179,7 +226,7 @@ async def general_exception_handler(request:Request, exception:StarletteHTTPExce
         else "An error occurred. Pleasecheck your reuest and try again"
         )
             
-        return templates.TemplateResponse(
+        return render_template(
             request,
             "error.html",{
             "status_code":exception.status_code,
@@ -193,7 +240,7 @@ async def validation_exception_handler(request:Request, exception:StarletteHTTPE
     if request.url.path.startswith("/api"):
         return await request_validation_exception_handler(request,exception)
     else:
-        return templates.TemplateResponse(
+        return render_template(
             request,
             "error.html",{
             "status_code":status.HTTP_422_UNPROCESSABLE_CONTENT,
@@ -0,0 +1,63 @@
+from sqlalchemy import Connection, MetaData, inspect, text
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.schema import CreateIndex, CreateTable
+
+import models
+
+
+def _add_user_deleted_at(conn:Connection):
+  columns = {column["name"] for column in inspect(conn).get_columns("users")}
+  if "deleted_at" not in columns:
+    conn.execute(text("ALTER TABLE users ADD COLUMN deleted_at DATETIME"))
+    print("🛠️ Upgraded schema: added users.deleted_at")
+
+
+def _use_user_autoincrement(conn:Connection):
+  # SQLite can't add AUTOINCREMENT to an existing table, so users is rebuilt:
+  # create the new table, copy the rows with their ids, drop the old one and rename.
+  # posts keeps referencing "users" by name, and the indexes are recreated by the next step
+  sql = conn.execute(text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'users'")).scalar()
+  if "AUTOINCREMENT" in sql.upper():
+    return
+  if conn.execute(text("PRAGMA foreign_keys")).scalar():
+    raise RuntimeError("cannot rebuild users with AUTOINCREMENT while PRAGMA foreign_keys is on")
+
+  table = models.User.__table__
+  rebuilt = table.to_metadata(MetaData(), name="users__rebuild")
+  columns = ", ".join(column.name for column in table.columns)
+  conn.execute(CreateTable(rebuilt))
+  conn.execute(text(f"INSERT INTO users__rebuild ({columns}) SELECT {columns} FROM users"))
+  conn.execute(text("DROP TABLE users"))
+  conn.execute(text("ALTER TABLE users__rebuild RENAME TO users"))
+  print("🛠️ Upgraded schema: rebuilt users with AUTOINCREMENT ids")
+
+
+def _add_missing_user_indexes(conn:Connection):
+  # the uniqueness checks in routers/users.py rely on the lower() indexes to settle concurrent signups.
+  # expression indexes are not reflected by the inspector, so sqlite_master is read directly
+  existing = set(conn.execute(text("SELECT name FROM sqlite_master WHERE type = 'index'")).scalars())
+  for index in models.User.__table__.indexes:
+    if index.name in existing:
+      continue
+    try:
+      conn.execute(CreateIndex(index, if_not_exists=True))
+    except IntegrityError as error:
+      raise RuntimeError(
+        f"cannot create unique index {index.name}: users has rows that differ only by letter case, "
+        "rename or remove the duplicates and restart"
+      ) from error
+    print(f"🛠️ Upgraded schema: created index {index.name}")
+
+
+def upgrade_schema(conn:Connection):
+  """
+  Bring a database created by an older version up to the current models.
+  create_all only creates missing tables, so changes to existing tables are
+  applied here. Every step checks first and is safe to run on each startup.
+  """
+  if not inspect(conn).has_table("users"):
+    return
+
+  _add_user_deleted_at(conn)
+  _use_user_autoincrement(conn)
+  _add_missing_user_indexes(conn)
@@ -2,7 +2,7 @@ from __future__ import annotations
 
 from datetime import UTC,datetime
 
-from sqlalchemy import DateTime, ForeignKey, Integer, String, Text
+from sqlalchemy import DateTime, ForeignKey, Index, Integer, String, Text, func
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from database import Base
@@ -14,10 +14,19 @@ class User(Base):
   username:Mapped[str] = mapped_column(String(50), unique=True, nullable=False)
   email:Mapped[str]= mapped_column(String(120), unique=True, nullable=False)
   password_hash:Mapped[str] = mapped_column(String(200), nullable=False)
+  deleted_at:Mapped[datetime|None] = mapped_column(DateTime(timezone=True), nullable=True, default=None)
 
 
   posts:Mapped[list[Post]] = relationship(back_populates="author", cascade="all, delete-orphan")
 
+  # usernames and emails are compared case-insensitively, so uniqueness is enforced on lower().
+  # AUTOINCREMENT keeps SQLite from handing a purged user's id, and so their still valid tokens, to a new signup
+  __table_args__ = (
+    Index("ix_users_username_lower", func.lower(username), unique=True),
+    Index("ix_users_email_lower", func.lower(email), unique=True),
+    {"sqlite_autoincrement":True},
+  )
+
 
   
 
@@ -0,0 +1,154 @@
+import asyncio
+import cProfile
+import io
+import pstats
+import time
+from collections import deque
+from contextvars import ContextVar
+from datetime import UTC, datetime
+from itertools import count
+
+from fastapi import Request
+from sqlalchemy import event, select
+from starlette.middleware.base import BaseHTTPMiddleware
+
+import models
+from auth import verify_access_token
+from config import settings
+from database import AsyncSessionLocal, engine
+
+
+MAX_QUERIES_PER_REQUEST = 200
+
+# worst recent requests over settings.slow_request_ms, and stored cProfile reports by id
+slow_requests:deque[dict] = deque(maxlen=settings.slow_request_buffer)
+profiles:dict[int,str] = {}
+
+_current:ContextVar[dict|None] = ContextVar("request_capture", default=None)
+_profile_ids = count(1)
+# only one profiler can be active in the interpreter at a time, a flagged request
+# arriving while another is profiled is served unprofiled with X-Profile-Skipped
+_profiler_lock = asyncio.Lock()
+
+
+#***************************************************capture hooks*********************************************************
+
+@event.listens_for(engine.sync_engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+  # kept on the execution context, which is discarded with the statement, so a failed
+  # statement that never reaches after_cursor_execute leaves nothing behind
+  if context is not None:
+    context._query_start = time.perf_counter()
+
+
+@event.listens_for(engine.sync_engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+  start = getattr(context, "_query_start", None)
+  if start is None:
+    return
+  elapsed = time.perf_counter() - start
+  capture = _current.get()
+  if capture is not None and len(capture["queries"]) < MAX_QUERIES_PER_REQUEST:
+    capture["queries"].append({"statement":statement, "ms":round(elapsed * 1000, 3)})
+
+
+def record_template(name:str, seconds:float):
+  capture = _current.get()
+  if capture is not None:
+    capture["templates"].append({"template":name, "ms":round(seconds * 1000, 3)})
+
+
+#***************************************************profiling*********************************************************
+
+def wants_profile(request:Request)->bool:
+  return request.headers.get("X-Profile") == "1" or request.query_params.get("profile") == "1"
+
+
+async def is_admin_request(request:Request)->bool:
+  scheme, _, token = request.headers.get("Authorization", "").partition(" ")
+  if scheme.lower() != "bearer" or not token:
+    return False
+
+  user_id = verify_access_token(token)
+  try:
+    user_id_int = int(user_id)
+  except (TypeError, ValueError):
+    return False
+  if user_id_int not in settings.admin_user_ids:
+    return False
+
+  async with AsyncSessionLocal() as db:
+    result = await db.execute(
+      select(models.User.id).where(models.User.id == user_id_int, models.User.deleted_at.is_(None))
+    )
+    return result.scalar() is not None
+
+
+def store_profile(profiler:cProfile.Profile)->int:
+  output = io.StringIO()
+  pstats.Stats(profiler, stream=output).sort_stats(pstats.SortKey.CUMULATIVE).print_stats(50)
+
+  profile_id = next(_profile_ids)
+  profiles[profile_id] = output.getvalue()
+  while len(profiles) > settings.profile_buffer:
+    del profiles[min(profiles)]
+  return profile_id
+
+
+class ProfilingMiddleware(BaseHTTPMiddleware):
+  """
+  Records SQL statements and template render times for every request, keeps the
+  ones slower than settings.slow_request_ms, and runs requests flagged with
+  X-Profile: 1 or ?profile=1 from an admin under cProfile, one at a time.
+  """
+  async def dispatch(self, request:Request, call_next):
+    capture = {"queries":[], "templates":[]}
+    token = _current.set(capture)
+
+    profiler = None
+    profile_skipped = False
+    if wants_profile(request) and await is_admin_request(request):
+      if _profiler_lock.locked():
+        profile_skipped = True
+      else:
+        # the lock is free, so this returns without yielding to another request
+        await _profiler_lock.acquire()
+        profiler = cProfile.Profile()
+
+    start_time = time.perf_counter()
+    try:
+      if profiler:
+        # on 3.12 cProfile hooks sys.monitoring for the whole interpreter, so other requests
+        # running on the loop or in the threadpool meanwhile show up in the report too
+        profiler.enable()
+      response = await call_next(request)
+    finally:
+      if profiler:
+        profiler.disable()
+        _profiler_lock.release()
+      _current.reset(token)
+    process_time = time.perf_counter() - start_time
+
+    profile_id = None
+    if profiler:
+      profile_id = store_profile(profiler)
+      response.headers["X-Profile-Id"] = str(profile_id)
+    elif profile_skipped:
+      response.headers["X-Profile-Skipped"] = "another profile is already running"
+
+    if process_time * 1000 >= settings.slow_request_ms:
+      slow_requests.append({
+        "method":request.method,
+        "path":request.url.path,
+        "status_code":response.status_code,
+        "ms":round(process_time * 1000, 3),
+        "captured_at":datetime.now(UTC),
+        "profile_id":profile_id,
+        **capture,
+      })
+
+    return response
+
+
+def worst_requests(limit:int)->list[dict]:
+  return sorted(slow_requests, key=lambda r: r["ms"], reverse=True)[:limit]
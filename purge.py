@@ -0,0 +1,112 @@
+import asyncio
+import time
+
+from sqlalchemy import delete, select
+
+import models
+from config import settings
+from database import AsyncSessionLocal
+
+
+# user_id -> {"status": "running" | "done" | "failed", "posts_deleted": int, "error": str | None, "finished_at": float | None}
+# for purges started by this process, finished entries expire after settings.purge_status_ttl_seconds
+purge_progress:dict[int,dict] = {}
+
+_tasks:set[asyncio.Task] = set()
+
+
+def _new_progress()->dict:
+  return {"status":"running", "posts_deleted":0, "error":None, "finished_at":None}
+
+
+def _prune_progress():
+  cutoff = time.monotonic() - settings.purge_status_ttl_seconds
+  for user_id, progress in list(purge_progress.items()):
+    if progress["finished_at"] is not None and progress["finished_at"] < cutoff:
+      del purge_progress[user_id]
+
+
+def get_progress(user_id:int)->dict|None:
+  _prune_progress()
+  return purge_progress.get(user_id)
+
+
+async def _execute_with_retries(db, user_id:int, statement):
+  # each statement is committed on its own, so a retry only repeats the failed chunk
+  for attempt in range(settings.purge_max_retries + 1):
+    try:
+      result = await db.execute(statement)
+      await db.commit()
+      return result
+    except Exception as error:
+      await db.rollback()
+      if attempt == settings.purge_max_retries:
+        raise
+      delay = settings.purge_retry_backoff_seconds * 2 ** attempt
+      print(f"⚠️ Purge of user {user_id} failed ({error!r}), retrying in {delay:.1f}s")
+      await asyncio.sleep(delay)
+
+
+async def purge_user(user_id:int, chunk_size:int|None = None):
+  """
+  Delete a soft-deleted user's posts in bulk chunks, then the user row itself.
+  Each chunk is its own transaction, so deleted chunks stay deleted across a
+  restart and the write lock is released between chunks. A chunk that keeps
+  failing after settings.purge_max_retries marks the purge as failed; it is
+  picked up again on the next startup.
+  """
+  chunk_size = chunk_size or settings.purge_chunk_size
+  progress = purge_progress.setdefault(user_id, _new_progress())
+
+  try:
+    async with AsyncSessionLocal() as db:
+      while True:
+        chunk = select(models.Post.id).where(models.Post.user_id == user_id).limit(chunk_size).scalar_subquery()
+        result = await _execute_with_retries(db, user_id, delete(models.Post).where(models.Post.id.in_(chunk)))
+
+        progress["posts_deleted"] += result.rowcount
+        if result.rowcount < chunk_size:
+          break
+        await asyncio.sleep(0)
+
+      await _execute_with_retries(
+        db, user_id,
+        delete(models.User).where(models.User.id == user_id, models.User.deleted_at.is_not(None))
+      )
+  except Exception as error:
+    progress["status"] = "failed"
+    progress["error"] = repr(error)
+    progress["finished_at"] = time.monotonic()
+    print(f"❌ Purge of user {user_id} failed after {progress['posts_deleted']} posts: {error!r}")
+    return
+
+  progress["status"] = "done"
+  progress["finished_at"] = time.monotonic()
+  print(f"🗑️ Purged user {user_id}: {progress['posts_deleted']} posts")
+
+
+def schedule_purge(user_id:int):
+  if any(task.get_name() == f"purge-user-{user_id}" for task in _tasks):
+    return
+
+  _prune_progress()
+  purge_progress[user_id] = _new_progress()
+  task = asyncio.create_task(purge_user(user_id), name=f"purge-user-{user_id}")
+  _tasks.add(task)
+  task.add_done_callback(_tasks.discard)
+
+
+async def resume_pending_purges():
+  # picks up users whose purge was interrupted by a restart
+  async with AsyncSessionLocal() as db:
+    result = await db.execute(select(models.User.id).where(models.User.deleted_at.is_not(None)))
+    user_ids = result.scalars().all()
+
+  for user_id in user_ids:
+    schedule_purge(user_id)
+
+
+async def cancel_purges():
+  for task in list(_tasks):
+    task.cancel()
+  await asyncio.gather(*_tasks, return_exceptions=True)
@@ -0,0 +1,26 @@
+
+from typing import Annotated
+
+from fastapi import APIRouter,  HTTPException, Query, status
+from fastapi.responses import PlainTextResponse
+
+from schemas import SlowRequest
+
+from auth import AdminUser
+import profiling
+
+router = APIRouter()
+
+
+
+@router.get("/slow-requests", response_model=list[SlowRequest])
+async def get_slow_requests(_admin:AdminUser, limit:Annotated[int, Query(ge=1, le=100)] = 20):
+    return profiling.worst_requests(limit)
+
+
+@router.get("/profiles/{profile_id}", response_class=PlainTextResponse)
+async def get_profile(profile_id:int, _admin:AdminUser):
+    profile = profiling.profiles.get(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Profile not found")
+    return profile
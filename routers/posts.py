@@ -1,7 +1,8 @@
 
 from typing import Annotated
 
-from fastapi import APIRouter,  HTTPException, status, Depends
+from fastapi import APIRouter,  HTTPException, status, Depends, Header
+from fastapi.responses import StreamingResponse
 
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
@@ -12,6 +13,7 @@ from database import get_db
 from schemas import  PostResponse,  PostCreate, PostUpdate
 
 from auth import CurrentUser
+from broadcaster import post_events
 
 router = APIRouter()
 
@@ -20,15 +22,25 @@ router = APIRouter()
 @router.get("", response_model=list[PostResponse])
 async def get_posts(db:Annotated[AsyncSession, Depends(get_db)]):
     result = await db.execute(
-    select(models.Post).options(selectinload(models.Post.author)).order_by(models.Post.date_posted.desc())
+    select(models.Post).join(models.Post.author).where(models.User.deleted_at.is_(None))
+    .options(selectinload(models.Post.author)).order_by(models.Post.date_posted.desc())
     )
     posts = result.scalars().all()
     return posts
 
+@router.get("/stream")
+async def stream_posts(last_event_id:Annotated[str|None, Header(alias="Last-Event-ID")] = None):
+    return StreamingResponse(
+        post_events.stream(last_event_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control":"no-cache", "X-Accel-Buffering":"no"},
+    )
+
 @router.get("/{post_id}", response_model=PostResponse)
 async def get_post(post_id:int, db:Annotated[AsyncSession, Depends(get_db)]):
     result = await db.execute(
-    select(models.Post).options(selectinload(models.Post.author)).where(models.Post.id == post_id)
+    select(models.Post).join(models.Post.author).options(selectinload(models.Post.author))
+    .where(models.Post.id == post_id, models.User.deleted_at.is_(None))
     )
     post = result.scalars().first()
     if post:
@@ -52,6 +64,7 @@ async def update_post_full(post_id:int, post_data:PostCreate, current_user:Curre
 
     await db.commit()
     await db.refresh(post, attribute_names=["author"])
+    post_events.publish("post_updated", PostResponse.model_validate(post).model_dump(mode="json"))
     
     return post
 
@@ -75,6 +88,7 @@ async def update_post_partial(post_id:int, current_user:CurrentUser, post_data:P
 
     await db.commit()
     await db.refresh(post, attribute_names=["author"])
+    post_events.publish("post_updated", PostResponse.model_validate(post).model_dump(mode="json"))
     
     return post
     
@@ -93,6 +107,7 @@ async def delete_post(post_id:int, current_user:CurrentUser, db:Annotated[AsyncS
 
     await db.delete(post)
     await db.commit()
+    post_events.publish("post_deleted", {"id":post_id})
 
 
 
@@ -112,5 +127,6 @@ async def create_post(post:PostCreate, current_user:CurrentUser, db:Annotated[As
     db.add(new_post)
     await db.commit()
     await db.refresh(new_post, attribute_names=["author"])
+    post_events.publish("post_created", PostResponse.model_validate(new_post).model_dump(mode="json"))
 
     return new_post
\ No newline at end of file
@@ -1,20 +1,23 @@
-from datetime import timedelta
+from datetime import UTC, datetime, timedelta
 from typing import Annotated
 
 from fastapi import APIRouter,  HTTPException, status, Depends
 from fastapi.security import OAuth2PasswordRequestForm
 
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
-from sqlalchemy import func, select
+from sqlalchemy import func, or_, select
 
 import models
 from config import settings
 
 from database import get_db
-from schemas import  PostResponse,  UserCreate, UserPrivate, UserPublic, Token ,UserUpdate
+from schemas import  PostResponse,  UserCreate, UserDeletionStatus, UserPrivate, UserPublic, Token ,UserUpdate
 
-from auth import create_access_token, hash_password, verify_password, CurrentUser
+from auth import create_access_token, get_token_user_id, hash_password, verify_password, CurrentUser
+from broadcaster import post_events
+from purge import get_progress, schedule_purge
 
 
 
@@ -22,32 +25,58 @@ router = APIRouter()
 
 
 
-@router.post(
-        "", 
-        response_model=UserPrivate,
-        status_code=status.HTTP_201_CREATED
-)
-async def create_user(user:UserCreate, db:Annotated[AsyncSession, Depends(get_db)]):
-    
-    result = await db.execute(
-        select(models.User).where(func.lower(models.User.username) == user.username.lower()),
-        )
-    existing_user = result.scalars().first()
-    if existing_user:
+async def _find_taken(db:AsyncSession, username:str|None, email:str|None, exclude_user_id:int|None = None)->tuple[bool,bool]:
+    """
+    Check username and email availability in one query, projecting only the two columns.
+    Returns (username_taken, email_taken).
+    """
+    conditions = []
+    if username is not None:
+        conditions.append(func.lower(models.User.username) == username.lower())
+    if email is not None:
+        conditions.append(func.lower(models.User.email) == email.lower())
+    if not conditions:
+        return False, False
+
+    # the lower() unique indexes allow at most one match per column
+    query = select(func.lower(models.User.username), func.lower(models.User.email)).where(or_(*conditions)).limit(2)
+    if exclude_user_id is not None:
+        query = query.where(models.User.id != exclude_user_id)
+
+    rows = (await db.execute(query)).all()
+    username_taken = username is not None and any(row[0] == username.lower() for row in rows)
+    email_taken = email is not None and any(row[1] == email.lower() for row in rows)
+    return username_taken, email_taken
+
+
+def _taken_from_integrity_error(error:IntegrityError)->tuple[bool,bool]:
+    # the pre-check can race with a concurrent signup, the unique indexes have the final say
+    message = str(error.orig)
+    return "username" in message, "email" in message
+
+
+def _raise_if_taken(username_taken:bool, email_taken:bool, email_detail:str = "Email already exists"):
+    if username_taken:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Username already exists"
         )
-    
-    result = await db.execute(
-        select(models.User).where(func.lower(models.User.email) == user.email.lower()),
-        )
-    existing_email = result.scalars().first()
-    if existing_email:
+    if email_taken:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Email already exists"
+            detail=email_detail
         )
+
+
+
+@router.post(
+        "", 
+        response_model=UserPrivate,
+        status_code=status.HTTP_201_CREATED
+)
+async def create_user(user:UserCreate, db:Annotated[AsyncSession, Depends(get_db)]):
+    
+    _raise_if_taken(*await _find_taken(db, user.username, user.email))
     
     new_user = models.User(
         username=user.username,
@@ -55,9 +84,13 @@ async def create_user(user:UserCreate, db:Annotated[AsyncSession, Depends(get_db
         password_hash = hash_password(user.password)
     )
     db.add(new_user)
-    await db.commit()
-    await db.refresh(new_user)
-
+    try:
+        await db.commit()
+    except IntegrityError as error:
+        await db.rollback()
+        _raise_if_taken(*_taken_from_integrity_error(error))
+        raise
+    # expire_on_commit=False keeps the values just written, and the insert filled in the id
     return new_user
 
 
@@ -67,7 +100,7 @@ async def login_for_access_token(
     db:Annotated[AsyncSession, Depends(get_db)]
 ):
     result = await db.execute(
-        select(models.User).where(func.lower(models.User.email) == form_data.username.lower())
+        select(models.User).where(func.lower(models.User.email) == form_data.username.lower(), models.User.deleted_at.is_(None))
     )
     user = result.scalars().first()
 
@@ -99,7 +132,7 @@ async def get_current_user(
 @router.get("/{user_id}", response_model=UserPublic)
 async def get_user(user_id:int, db:Annotated[AsyncSession, Depends(get_db)]):
     result = await db.execute(
-    select(models.User).where(models.User.id == user_id),
+    select(models.User).where(models.User.id == user_id, models.User.deleted_at.is_(None)),
     )
     user = result.scalars().first()
 
@@ -113,7 +146,7 @@ async def get_user(user_id:int, db:Annotated[AsyncSession, Depends(get_db)]):
 @router.get("/{user_id}/posts", response_model=list[PostResponse])
 async def get_user_posts(user_id:int,db:Annotated[AsyncSession, Depends(get_db)]):
     result = await db.execute(
-    select(models.User).where(models.User.id == user_id),
+    select(models.User).where(models.User.id == user_id, models.User.deleted_at.is_(None)),
     )
     user = result.scalars().first()
 
@@ -134,45 +167,28 @@ async def update_user_partial(user_id:int, user_data:UserUpdate, current_user:Cu
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not Authorized to update the user")
 
     result = await db.execute(
-    select(models.User).where(models.User.id == user_id),
+    select(models.User).where(models.User.id == user_id, models.User.deleted_at.is_(None)),
     )
     user = result.scalars().first()
 
     if not user:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,detail="user not found")
     
-    if user_data.username is not None and user_data.username.lower() != user.username.lower():
-        result = await db.execute(
-        select(models.User).where(func.lower(models.User.username) == user_data.username.lower()),
-        )
-        existing_username = result.scalars().first()
-        if existing_username:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Username already exists"
-            )
-    
-    if user_data.email is not None and user_data.email.lower() != user.email.lower():
-        result = await db.execute(
-        select(models.User).where(func.lower(models.User.email) == user_data.email.lower()),
-        )
-        existing_email = result.scalars().first()
-        if existing_email:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="email already exists"
-            )
+    username_taken, email_taken = await _find_taken(db, user_data.username, user_data.email, exclude_user_id=user.id)
+    _raise_if_taken(username_taken, email_taken, email_detail="email already exists")
 
-    update_user = user_data.model_dump(exclude_unset=True)
+    if user_data.username is not None:
+        user.username = user_data.username
+    if user_data.email is not None:
+        user.email = user_data.email.lower()
 
-    if update_user.username is not None:
-        user.username = update_user.username
-    if update_user.email is not None:
-        user.email = update_user.email.lower()
 
-
-    await db.commit()
-    await db.refresh(user)
+    try:
+        await db.commit()
+    except IntegrityError as error:
+        await db.rollback()
+        _raise_if_taken(*_taken_from_integrity_error(error), email_detail="email already exists")
+        raise
 
     return user
 
@@ -182,17 +198,34 @@ async def delete_user(user_id:int, current_user:CurrentUser, db:Annotated[AsyncS
 
     if current_user.id != user_id:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not Authorized to delete the user")
-    
-    result = await db.execute(
-    select(models.User).where(models.User.id == user_id),
-    )
-    user = result.scalars().first()
-
-    if not user:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,detail="user not found")
 
-    await db.delete(user)
+    # soft delete now, posts and the user row are purged in bulk chunks in the background
+    current_user.deleted_at = datetime.now(UTC)
     await db.commit()
-    
+    # one event instead of a post_deleted per purged post, feed clients drop all of this author's posts
+    post_events.publish("user_deleted", {"id":user_id})
+
+    schedule_purge(user_id)
+
 
+@router.get("/{user_id}/deletion", response_model=UserDeletionStatus)
+async def get_user_deletion(user_id:int, requester_id:Annotated[int, Depends(get_token_user_id)], db:Annotated[AsyncSession, Depends(get_db)]):
 
+    # the owner's token is still accepted after the soft delete, other callers must be an active admin
+    if requester_id != user_id:
+        result = await db.execute(
+        select(models.User.id).where(models.User.id == requester_id, models.User.deleted_at.is_(None)),
+        )
+        if requester_id not in settings.admin_user_ids or result.scalar() is None:
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not Authorized to view this deletion")
+
+    progress = get_progress(user_id)
+    if progress is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,detail="no deletion in progress for this user")
+
+    return UserDeletionStatus(
+        user_id=user_id,
+        status=progress["status"],
+        posts_deleted=progress["posts_deleted"],
+        error=progress["error"],
+    )
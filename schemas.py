@@ -1,4 +1,5 @@
 from datetime import datetime
+from typing import Literal
 from pydantic import BaseModel, ConfigDict, Field, EmailStr
 
 
@@ -20,6 +21,12 @@ class Token(BaseModel):
   access_token:str
   token_type:str
 
+class UserDeletionStatus(BaseModel):
+  user_id:int
+  status:Literal["running","done","failed"]
+  posts_deleted:int
+  error:str|None = None
+
 class UserUpdate(BaseModel):
   username:str|None =Field(default=None, min_length=1, max_length=50)
   email:EmailStr|None = Field(default=None, max_length=120)
@@ -44,4 +51,25 @@ class PostResponse(PostBase):
   id: int
   user_id:int
   date_posted:datetime
-  author:UserPublic
\ No newline at end of file
+  author:UserPublic
+
+
+class CapturedQuery(BaseModel):
+  statement:str
+  ms:float
+
+
+class CapturedTemplate(BaseModel):
+  template:str
+  ms:float
+
+
+class SlowRequest(BaseModel):
+  method:str
+  path:str
+  status_code:int
+  ms:float
+  captured_at:datetime
+  profile_id:int|None
+  queries:list[CapturedQuery]
+  templates:list[CapturedTemplate]